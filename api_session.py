@@ -0,0 +1,12 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Wspólna sesja HTTP dla zapytań do API Sejmu.
+# Utrzymuje połączenia (keep-alive), więc kolejne zapytania nie powtarzają handshake'u TLS.
+session = requests.Session()
+session.mount('https://', HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3)
+))
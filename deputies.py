@@ -1,6 +1,6 @@
 import os
 
-import requests
+from api_session import session
 
 path = 'data/deputies/'
 
@@ -43,7 +43,7 @@ def download_deputies():
     Download deputies data from the given URL and save it to a CSV file.
     """
 
-    response = requests.get('https://api.sejm.gov.pl/sejm/term')
+    response = session.get('https://api.sejm.gov.pl/sejm/term')
     terms = response.json()
 
     for term in terms:
@@ -62,7 +62,7 @@ def download_deputies():
             os.makedirs(term_dir)
 
         # Download deputies data
-        response = requests.get(f'https://api.sejm.gov.pl/sejm/term{term_number}/MP')
+        response = session.get(f'https://api.sejm.gov.pl/sejm/term{term_number}/MP')
         deputies = response.json()
 
         # Get all unique attributes
@@ -1,10 +1,13 @@
 '''
 Sejm Crawler
 '''
-import json
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 
-from test_parser import process_html_transcripts
+import orjson
+
+from test_parser import load_metadata, process_html_transcripts
 
 # This script is a web crawler that scrapes data from the Polish Sejm website.
 
@@ -16,21 +19,81 @@ if not os.path.exists('data'):
     os.makedirs('data/transcripts')
 
 
+@lru_cache(maxsize=32)
+def _cached_load_metadata(deputies_path):
+    """
+    Load the deputies name automaton once per kadencja in each worker process.
+    """
+    return load_metadata(deputies_path)
+
+
+def _run(args):
+    """
+    Worker wrapper for ProcessPoolExecutor: unpacks a job tuple and processes one session.
+    """
+    transcript_dir, deputies_path, output_dir = args
+    process_html_transcripts(transcript_dir, _cached_load_metadata(deputies_path), output_dir)
+
+
+def _is_up_to_date(output_paths, source_mtime):
+    """
+    Check whether all output files exist and are not older than the newest source (given as mtime).
+    """
+    if not all(os.path.exists(p) for p in output_paths):
+        return False
+    return min(os.path.getmtime(p) for p in output_paths) >= source_mtime
+
+
+def _find_session_job(transcript_dir, deputies_path):
+    """
+    Scan one session directory for its backbone _0.html and build the job tuple.
+    Returns None if there is no backbone or the session was already processed.
+    """
+    with os.scandir(transcript_dir) as it:
+        htmls = [e for e in it if e.name.lower().endswith('.html')]
+    backbone = next((e.name for e in htmls if e.name.endswith('_0.html')), None)
+    if backbone is None:
+        return None
+    base = backbone[:-7]  # YYYY-MM-DD
+    year = base[:4]
+    output_dir = os.path.join('output', year)
+
+    # Pominięcie posiedzenia, jeśli wyniki są nowsze niż wszystkie pliki {base}_N.html,
+    # sam katalog posiedzenia (dodane/usunięte pliki) i metadane posłów
+    source_mtime = max(
+        max(e.stat().st_mtime for e in htmls if e.name.startswith(f"{base}_")),
+        os.path.getmtime(transcript_dir),
+        os.path.getmtime(deputies_path),
+    )
+    outputs = (
+        os.path.join(output_dir, f"{base}_combined.txt"),
+        os.path.join(output_dir, f"{base}_metadata.json"),
+    )
+    if _is_up_to_date(outputs, source_mtime):
+        return None
+    return transcript_dir, deputies_path, output_dir
+
+
 def transcripts_process():
-    for kadencja_dir in os.listdir('data/transcripts'):
-        kadencja_path = os.path.join('data/transcripts', kadencja_dir)
-        if os.path.isdir(kadencja_path):
-            for posiedzenie_dir in os.listdir(kadencja_path):
-                transcript_dir = os.path.join(kadencja_path, posiedzenie_dir)
-                if os.path.isdir(transcript_dir):
-                    deputies_path = os.path.join('data/deputies', kadencja_dir, 'deputies.csv')
-                    if os.path.exists(deputies_path):
-                        htmls = [f for f in os.listdir(transcript_dir) if f.endswith('_0.html')]
-                        if htmls:
-                            base = htmls[0][:-7]  # YYYY-MM-DD
-                            year = base[:4]
-                            output_dir = os.path.join('output', year)
-                            process_html_transcripts(transcript_dir, deputies_path, output_dir)
+    sessions = []
+    with os.scandir('data/transcripts') as kadencje:
+        for kadencja in kadencje:
+            if not kadencja.is_dir():
+                continue
+            deputies_path = os.path.join('data/deputies', kadencja.name, 'deputies.csv')
+            if not os.path.exists(deputies_path):
+                continue
+            with os.scandir(kadencja.path) as posiedzenia:
+                sessions.extend((p.path, deputies_path) for p in posiedzenia if p.is_dir())
+
+    # Katalogi posiedzeń są duże, więc listujemy je równolegle
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        jobs = [job for job in executor.map(lambda s: _find_session_job(*s), sessions) if job]
+
+    # Każde posiedzenie przetwarzamy niezależnie, więc rozkładamy je na wszystkie rdzenie
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for _ in executor.map(_run, jobs):
+            pass
 
 
 def merge_all_transcripts(base_output_dir: str, merged_txt_path: str, merged_json_path: str):
@@ -51,20 +114,20 @@ def merge_all_transcripts(base_output_dir: str, merged_txt_path: str, merged_jso
                     all_txt_content.append(f"{content}")
                 elif file.endswith('_metadata.json'):
                     json_path = os.path.join(year_path, file)
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
+                    with open(json_path, 'rb') as f:
+                        metadata = orjson.loads(f.read())
                     all_metadata.extend(metadata)
 
     # Write merged TXT
     with open(merged_txt_path, 'w', encoding='utf-8') as f:
         f.write('\n'.join(all_txt_content))
     # Write merged JSON
-    with open(merged_json_path, 'w', encoding='utf-8') as f:
-        json.dump(all_metadata, f, ensure_ascii=False, indent=2)
+    with open(merged_json_path, 'wb') as f:
+        f.write(orjson.dumps(all_metadata))
 
 if __name__ == '__main__':
     # download_all_terms()
-    # download_transcripts()
+    # asyncio.run(download_transcripts())
     # download_deputies()
     # transcripts_process()
     merge_all_transcripts('output', 'merged_all.txt', 'merged_all.json')
@@ -2,7 +2,13 @@ import csv
 import json
 import os
 
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+
+_HTML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+_MOWCA_XPATH = etree.XPath("//h2[contains(concat(' ', normalize-space(@class), ' '), ' mowca ')]")
+_CONTENT_XPATH = etree.XPath("//*[self::p or self::h1 or self::h2 or self::blockquote]")
+_FIRST_SPEAKER_LINK_XPATH = etree.XPath("(//p[.//a[@name]])[1]")
 
 
 def load_session_metadata(base_path, kadencja, posiedzenie, date_str):
@@ -20,15 +26,18 @@ def parse_main_html(base_path, kadencja, posiedzenie, date_str):
     dla wypowiedzi nr 0 (przebieg posiedzenia).
     """
     html_path = os.path.join(base_path, str(kadencja), str(posiedzenie), f"{date_str}_0.html")
-    with open(html_path, 'r', encoding='utf-8') as f:
-        soup = BeautifulSoup(f, 'html.parser')
+    root = lxml.html.parse(html_path, _HTML_PARSER).getroot()
+    if root is None:  # pusty plik
+        return ""
+
+    # Akapit z linkiem do pierwszego mówcy kończy przebieg posiedzenia
+    first_link = next(iter(_FIRST_SPEAKER_LINK_XPATH(root)), None)
 
     content = []
-    for tag in soup.find_all(['p', 'h1', 'h2', 'blockquote']):
-        # Przerywamy po napotkaniu linku do pierwszego mówcy
-        if tag.name == 'p' and tag.find('a', attrs={'name': True}):
+    for tag in _CONTENT_XPATH(root):
+        if tag is first_link:
             break
-        content.append(tag.get_text(strip=True))
+        content.append(''.join(t.strip() for t in tag.itertext()))
     return "\n".join(content)
 
 
@@ -38,17 +47,18 @@ def parse_speaker_html(base_path, kadencja, posiedzenie, date_str, num):
     i zwraca czysty tekst jego wypowiedzi.
     """
     html_path = os.path.join(base_path, str(kadencja), str(posiedzenie), f"{date_str}_{num}.html")
-    with open(html_path, 'r', encoding='utf-8') as f:
-        soup = BeautifulSoup(f, 'html.parser')
+    root = lxml.html.parse(html_path, _HTML_PARSER).getroot()
+    if root is None:  # pusty plik
+        return ""
 
     paragraphs = []
-    mowca_tag = soup.find('h2', class_='mowca')
-    if mowca_tag:
-        for sib in mowca_tag.find_next_siblings():
-            if sib.name == 'h2':
+    mowca_tags = _MOWCA_XPATH(root)
+    if mowca_tags:
+        for sib in mowca_tags[0].itersiblings():
+            if sib.tag == 'h2':
                 break
-            if sib.name == 'p':
-                paragraphs.append(sib.get_text(strip=True))
+            if sib.tag == 'p':
+                paragraphs.append(''.join(t.strip() for t in sib.itertext()))
     return "\n".join(paragraphs)
 
 
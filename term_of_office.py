@@ -1,7 +1,8 @@
 import os
 
 import pandas as pd
-import requests
+
+from api_session import session
 
 path = 'data/terms/'
 
@@ -11,7 +12,7 @@ def download_all_terms():
     Download all terms of office data from the given URL and save it to a CSV file.
     """
 
-    response = requests.get('https://api.sejm.gov.pl/sejm/term')
+    response = session.get('https://api.sejm.gov.pl/sejm/term')
     terms = response.json()
 
     if not os.path.exists(path):
@@ -1,12 +1,35 @@
-import json
+import csv
+import io
 import os
 import re
 
-import pandas as pd
-from bs4 import BeautifulSoup
+import ahocorasick
+import lxml.html
+import orjson
+from lxml import etree
 
+_HTML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+_MOWCA_XPATH = etree.XPath("//h2[contains(concat(' ', normalize-space(@class), ' '), ' mowca ')]")
+_MOWCA_LINK_XPATH = etree.XPath(
+    "//p[contains(concat(' ', normalize-space(@class), ' '), ' mowca-link ')"
+    " or contains(concat(' ', normalize-space(@class), ' '), ' mowca-link1 ')]"
+)
 
-def process_old_format(soup0, base):
+_TRAILING_COLON_RE = re.compile(r':$')
+# Sub-speaker marker: "Poseł [name]:" with a name of at most 80 characters
+_SUB_SPEAKER_PREFIX = 'Poseł '
+_SUB_SPEAKER_MAX_NAME = 80
+_INT_RE = re.compile(r"[+-]?\d+")
+_FLOAT_RE = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+# Default missing-value and boolean spellings recognised by pandas.read_csv
+_NA_VALUES = frozenset({
+    None, '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+})
+_BOOL_VALUES = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+
+
+def process_old_format(root0, base):
     """
     Stary format: mówca to <P><B><FONT SIZE="+1">...</FONT></B></P>.
     Zbieramy kolejne <P> aż do następnego takiego znacznika.
@@ -18,8 +41,8 @@ def process_old_format(soup0, base):
     buffer_context = []
 
     def norm(s):
-        s = re.sub(r'\xa0+', ' ', s)
-        return re.sub(r'\s+', ' ', s).strip()
+        # str.split() treats \xa0 as whitespace too
+        return ' '.join(s.split())
 
     def flush_speech():
         nonlocal current_speaker, current_text
@@ -37,9 +60,9 @@ def process_old_format(soup0, base):
         buffer_context[:] = []
 
     def is_speaker_marker(p):
-        if not (p.find('b') and p.find('font')):
+        if p.find('.//b') is None or p.find('.//font') is None:
             return False
-        txt = p.get_text(" ", strip=True)
+        txt = " ".join(" ".join(p.itertext()).split())
         if txt.endswith(':'):
             return True
         role_prefixes = (
@@ -49,8 +72,8 @@ def process_old_format(soup0, base):
         )
         return any(txt.startswith(rp) for rp in role_prefixes)
 
-    for p in soup0.find_all('p'):
-        txt = p.get_text(" ", strip=True)
+    for p in root0.iter('p'):
+        txt = " ".join(" ".join(p.itertext()).split())
         if not txt:
             continue
         if is_speaker_marker(p):
@@ -58,7 +81,7 @@ def process_old_format(soup0, base):
                 flush_speech()
             else:
                 flush_context()
-            current_speaker = re.sub(r':$', '', txt).strip()
+            current_speaker = _TRAILING_COLON_RE.sub('', txt).strip()
             current_text = []
         else:
             (current_text if current_speaker is not None else buffer_context).append(txt)
@@ -70,65 +93,152 @@ def process_old_format(soup0, base):
 
     return speeches
 
-def load_metadata(deputies_path: str) -> pd.DataFrame:
+
+def _convert_columns(rows: list, columns: list):
     """
-    Load deputies metadata into a DataFrame. Supports CSV and TSV.
-    Ensures a 'name' column and converts NaN to None for JSON.
+    Convert raw CSV fields in place, choosing one type per column from all its values
+    like pandas.read_csv does by default. Empty fields and pandas' default NA strings
+    ('NA', 'N/A', 'null', 'NaN', ...) become None. Among the remaining values, a column
+    of integers becomes int (float if it has missing values), a column of numbers becomes
+    float (surrounding whitespace is ignored), a column of True/TRUE/true and
+    False/FALSE/false becomes bool, anything else stays str unchanged.
     """
-    if deputies_path.lower().endswith('.tsv'):
-        df = pd.read_csv(deputies_path, sep='\t')
-    else:
-        df = pd.read_csv(deputies_path)
-    if 'name' not in df.columns:
+    for col in columns:
+        for row in rows:
+            if row.get(col) in _NA_VALUES:
+                row[col] = None
+        present = [row[col] for row in rows if row[col] is not None]
+        has_missing = len(present) < len(rows)
+        if not present:
+            continue
+        stripped = [v.strip() for v in present]
+        if all(_INT_RE.fullmatch(v) for v in stripped):
+            convert = float if has_missing else int
+        elif all(_FLOAT_RE.fullmatch(v) for v in stripped):
+            convert = float
+        elif all(v in _BOOL_VALUES for v in present):
+            convert = _BOOL_VALUES.get
+        else:
+            continue
+        for row in rows:
+            if row[col] is not None:
+                row[col] = convert(row[col].strip())
+
+
+def load_metadata(deputies_path: str) -> ahocorasick.Automaton:
+    """
+    Load deputies metadata rows. Supports CSV and TSV.
+    Ensures a 'name' key and converts empty fields to None for JSON.
+    Returns an Aho-Corasick automaton over the lowercased deputy names,
+    each name mapped to its metadata records.
+    """
+    delimiter = '\t' if deputies_path.lower().endswith('.tsv') else ','
+    with open(deputies_path, encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        columns = reader.fieldnames or []
+        rows = list(reader)
+    for row_num, row in enumerate(rows, start=2):
+        # DictReader puts surplus fields under the None key; pandas rejects such rows too
+        if None in row:
+            raise ValueError(f"Nadmiarowe pola w wierszu {row_num} pliku {deputies_path}")
+    _convert_columns(rows, columns)
+    if 'name' not in columns:
         for col in ['firstLastName', 'Speaker_name', 'speaker']:
-            if col in df.columns:
-                df['name'] = df[col]
+            if col in columns:
+                for row in rows:
+                    row['name'] = row[col]
                 break
         else:
-            raise KeyError(f"Brak kolumny 'name' w metadanych. Dostępne kolumny: {list(df.columns)}")
-    df = df.where(pd.notnull(df), None)
-    return df
+            raise KeyError(f"Brak kolumny 'name' w metadanych. Dostępne kolumny: {list(columns)}")
+
+    name_index = {}
+    for rec in rows:
+        if isinstance(rec['name'], str) and rec['name']:
+            name_index.setdefault(rec['name'].lower(), []).append(rec)
+
+    # One automaton over all names matches every deputy contained in a speaker string in a single pass
+    automaton = ahocorasick.Automaton()
+    for order, (name, recs) in enumerate(name_index.items()):
+        automaton.add_word(name, (order, recs))
+    automaton.make_automaton()
+    return automaton
+
+
+def match_metadata(speaker: str, automaton: ahocorasick.Automaton) -> list:
+    """
+    Return metadata records of all deputies whose name appears in the speaker string (case-insensitive).
+    """
+    if automaton.kind != ahocorasick.AHOCORASICK:
+        return []  # no deputy names loaded
+    # Deduplicate repeated hits and keep the deputies file order
+    hits = dict(value for _, value in automaton.iter(speaker.lower()))
+    return [rec for _, recs in sorted(hits.items()) for rec in recs]
 
 
-def parse_speech_file(transcript_dir: str, base: str, idx: str) -> list:
+def parse_speech_file(html_by_idx: dict, idx: str) -> list:
     """
     Load individual speech HTML and return list of (speaker, text) tuples.
+    html_by_idx maps speech numbers to paths of the session's _N.html files.
     Splits on sub-speakers like "Poseł [name]: [text]" if present.
     Preserves parentheses insertions as part of text.
     """
-    path = os.path.join(transcript_dir, f"{base}_{int(idx)}.html")
-    if not os.path.exists(path):
+    path = html_by_idx.get(int(idx))
+    if path is None:
         return []
-    with open(path, encoding='utf-8') as f:
-        soup = BeautifulSoup(f, 'html.parser')
-    header = soup.find('h2', class_='mowca')
-    if not header:
+    root = lxml.html.parse(path, _HTML_PARSER).getroot()
+    if root is None:  # pusty plik
         return []
-    speaker_main = header.get_text(strip=True).rstrip(':').strip()  # Strip trailing ':' early
-    segments = []
-    for sib in header.find_next_siblings():
-        if sib.name == 'h2':
-            break
-        if sib.name == 'p':
-            text = sib.get_text(separator=' ', strip=True)
-            if text:
-                segments.append(text)
-    full = ' '.join(segments)
-    full = re.sub(r"\s+", ' ', full).strip()
+    headers = _MOWCA_XPATH(root)
+    if not headers:
+        return []
+    header = headers[0]
+    speaker_main = ''.join(t.strip() for t in header.itertext()).rstrip(':').strip()  # Strip trailing ':' early
 
-    # Split on sub-speakers pattern: "Poseł [name]: [text until next or end]"
-    pattern = r"(Poseł\s+[^:]+:\s*[^P]+?(?=\s*Poseł\s+|$))"
-    matches = re.findall(pattern, full, re.DOTALL)
+    # Single pass over the paragraphs: build the full text and, at the same time,
+    # split it on sub-speakers pattern: "Poseł [name]: [text until next or end]"
+    full_buf = io.StringIO()
     sub_speeches = []
-    if matches:
-        for match in matches:
-            # Extract speaker and text from match
-            parts = re.split(r":\s*", match, maxsplit=1)
-            if len(parts) == 2:
-                sub_speaker = parts[0].rstrip(':').strip()  # Strip trailing ':' if any
-                sub_text = re.sub(r"\s+", ' ', parts[1]).strip()
+    sub_speaker = None
+    sub_parts = []
+
+    def flush_sub_speech():
+        if sub_speaker is not None:
+            sub_text = ' '.join(part for part in (s.strip() for s in sub_parts) if part)
+            if sub_text:
                 sub_speeches.append((sub_speaker, sub_text))
 
+    for sib in header.itersiblings():
+        if sib.tag == 'h2':
+            break
+        if sib.tag != 'p':
+            continue
+        text = " ".join(" ".join(sib.itertext()).split())
+        if not text:
+            continue
+        if full_buf.tell():
+            full_buf.write(' ')
+        full_buf.write(text)
+
+        cursor = 0
+        pos = text.find(_SUB_SPEAKER_PREFIX)
+        while pos != -1:
+            name_start = pos + len(_SUB_SPEAKER_PREFIX)
+            colon = text.find(':', name_start, name_start + _SUB_SPEAKER_MAX_NAME + 1)
+            if colon > name_start:
+                if sub_speaker is not None:
+                    sub_parts.append(text[cursor:pos])
+                flush_sub_speech()
+                sub_speaker = text[pos:colon].strip()
+                sub_parts = []
+                cursor = colon + 1
+                pos = text.find(_SUB_SPEAKER_PREFIX, cursor)
+            else:
+                pos = text.find(_SUB_SPEAKER_PREFIX, pos + 1)
+        if sub_speaker is not None:
+            sub_parts.append(text[cursor:])
+    flush_sub_speech()
+    full = full_buf.getvalue()
+
     # Check if this is a vow section (many short sub-speeches)
     if sub_speeches and len(sub_speeches) > 10:
         avg_len = sum(len(t) for _, t in sub_speeches) / len(sub_speeches)
@@ -139,118 +249,134 @@ def parse_speech_file(transcript_dir: str, base: str, idx: str) -> list:
     return [(speaker_main, full)]
 
 
-def process_html_transcripts(transcript_dir: str, deputies_path: str, output_dir: str):
+def process_html_transcripts(transcript_dir: str, name_automaton: ahocorasick.Automaton, output_dir: str):
     """
     Reads backbone _0.html sequentially. Outputs combined.txt with lines:
     uniqueId<TAB>speaker: text for speeches (or just text for contexts), preserving order.
     Contexts and speeches share a unified numeric key sequence. Contexts are merged per block.
     Splits speech blocks into sub-speeches if detected.
-    Also outputs metadata JSON for speeches.
+    Also outputs metadata JSON for speeches. Both outputs are streamed as records are produced.
+    Outputs are named by date only, so sessions from different proceedings held
+    on the same date still overwrite each other (last writer wins).
     Handles both new and old formats.
+    name_automaton is the deputies name automaton returned by load_metadata.
     """
     os.makedirs(output_dir, exist_ok=True)
 
     # Identify backbone file
-    htmls = [f for f in os.listdir(transcript_dir) if f.lower().endswith('.html')]
+    with os.scandir(transcript_dir) as it:
+        entries = [e for e in it if e.name.lower().endswith('.html')]
+    htmls = [e.name for e in entries]
     backbone = next((f for f in htmls if f.endswith('_0.html')), None)
     if not backbone:
         raise FileNotFoundError('Brak backbone *_0.html')
     base = backbone[:-7]
 
-    with open(os.path.join(transcript_dir, backbone), encoding='utf-8') as f:
-        soup0 = BeautifulSoup(f, 'html.parser')
+    root0 = lxml.html.parse(os.path.join(transcript_dir, backbone), _HTML_PARSER).getroot()
+    if root0 is None:  # pusty backbone: przetwarzamy jak puste posiedzenie
+        root0 = lxml.html.Element('html')
 
-    metadata_df = load_metadata(deputies_path)
-    combined = []
-    metadata_list = []
+    speaker_cache = {}  # speaker -> matched metadata records, each distinct speaker is matched once
     seq = 1
     buffer_context = []
 
+    out_txt = os.path.join(output_dir, f"{base}_combined.txt")
+    out_meta = os.path.join(output_dir, f"{base}_metadata.json")
+
+    def emit(line_text, speaker_to_match):
+        """
+        Write one combined line and its metadata entry straight to the output files.
+        """
+        nonlocal seq
+        uid = f"{base}_{seq}"
+        txt_f.write(f"{uid}\t{line_text}\n")
+        recs = []
+        if speaker_to_match:
+            if speaker_to_match not in speaker_cache:
+                speaker_cache[speaker_to_match] = match_metadata(speaker_to_match, name_automaton)
+            recs = speaker_cache[speaker_to_match]
+        if seq > 1:
+            meta_f.write(b',\n')
+        meta_f.write(orjson.dumps({'id': uid, 'speaker': speaker_to_match, 'metadata': recs}))
+        seq += 1
+
     def flush_context():
-        nonlocal seq, buffer_context
+        nonlocal buffer_context
         if buffer_context:
             merged = ' '.join(buffer_context)
-            clean = re.sub(r"\s+", ' ', merged).strip()
-            uid = f"{base}_{seq}"
-            combined.append(f"{uid}\t{clean}")
-            metadata_list.append({'id': uid, 'speaker': None, 'metadata': []})
-            seq += 1
+            clean = ' '.join(merged.split())
+            emit(clean, None)
             buffer_context.clear()
 
     # --- poprawione wykrywanie formatu ---
     pattern = re.compile(rf'^{re.escape(base)}_(\d+)\.html$', re.I)
-    has_partials_for_base = any((m := pattern.match(f)) and m.group(1) != '0' for f in htmls)
-    has_mowca_links = soup0.select_one('p.mowca-link, p.mowca-link1') is not None
+    html_by_idx = {int(m.group(1)): e.path for e in entries if (m := pattern.match(e.name))}
+    has_partials_for_base = any(idx != 0 for idx in html_by_idx)
+    has_mowca_links = bool(_MOWCA_LINK_XPATH(root0))
     is_new_format = has_partials_for_base or has_mowca_links
 
-    if is_new_format:
-        # --- nowy format ---
-        for p in soup0.find_all('p'):
-            if 'mowca-link' in (p.get('class') or []):
-                flush_context()
-                a = p.find('a', attrs={'name': True})
-                if not a:
-                    continue
-                idx = a['name']
-                speaker_main = a.get_text(strip=True).rstrip(':').strip()
-                sub_speeches = parse_speech_file(transcript_dir, base, idx)
-                for sub_speaker, sub_text in sub_speeches:
-                    uid = f"{base}_{seq}"
-                    if sub_speaker:
-                        sub_speaker = sub_speaker.rstrip(':').strip()
-                        line_text = f"{sub_speaker}: {sub_text}"
+    # Both files are written incrementally to temporary paths and moved into place once complete.
+    # The pid suffix keeps parallel workers from sharing a temp file when two sessions have the same date.
+    tmp_txt = f"{out_txt}.{os.getpid()}.part"
+    tmp_meta = f"{out_meta}.{os.getpid()}.part"
+    try:
+        with open(tmp_txt, 'w', encoding='utf-8') as txt_f, open(tmp_meta, 'wb') as meta_f:
+            meta_f.write(b'[\n')
+
+            if is_new_format:
+                # --- nowy format ---
+                for p in root0.iter('p'):
+                    if 'mowca-link' in p.classes:
+                        flush_context()
+                        a = p.find('.//a[@name]')
+                        if a is None:
+                            continue
+                        idx = a.get('name')
+                        speaker_main = ''.join(t.strip() for t in a.itertext()).rstrip(':').strip()
+                        sub_speeches = parse_speech_file(html_by_idx, idx)
+                        for sub_speaker, sub_text in sub_speeches:
+                            if sub_speaker:
+                                sub_speaker = sub_speaker.rstrip(':').strip()
+                                line_text = f"{sub_speaker}: {sub_text}"
+                            else:
+                                line_text = sub_text
+                            speaker_to_match = sub_speaker if sub_speaker != speaker_main else speaker_main
+                            emit(line_text, speaker_to_match)
                     else:
-                        line_text = sub_text
-                    combined.append(f"{uid}\t{line_text}")
-                    speaker_to_match = sub_speaker if sub_speaker != speaker_main else speaker_main
-                    rows = metadata_df[metadata_df['name'].apply(lambda n: n and n in speaker_to_match)]
-                    recs = rows.to_dict(orient='records')
-                    metadata_list.append({'id': uid, 'speaker': speaker_to_match, 'metadata': recs})
-                    seq += 1
-            else:
-                text = p.get_text(separator=' ', strip=True)
-                if text:
-                    buffer_context.append(text)
-    else:
-        # --- stary format ---
-        sub_speeches = process_old_format(soup0, base)
-        for speaker, text in sub_speeches:
-            uid = f"{base}_{seq}"
-            if speaker:
-                speaker = speaker.rstrip(':').strip()
-                line_text = f"{speaker}: {text}"
-                speaker_to_match = speaker
-            else:
-                line_text = text
-                speaker_to_match = None
-            combined.append(f"{uid}\t{line_text}")
-            if speaker_to_match:
-                rows = metadata_df[metadata_df['name'].apply(lambda n: n and n in speaker_to_match)]
-                recs = rows.to_dict(orient='records')
+                        text = " ".join(" ".join(p.itertext()).split())
+                        if text:
+                            buffer_context.append(text)
             else:
-                recs = []
-            metadata_list.append({'id': uid, 'speaker': speaker_to_match, 'metadata': recs})
-            seq += 1
+                # --- stary format ---
+                sub_speeches = process_old_format(root0, base)
+                for speaker, text in sub_speeches:
+                    if speaker:
+                        speaker = speaker.rstrip(':').strip()
+                        line_text = f"{speaker}: {text}"
+                        speaker_to_match = speaker
+                    else:
+                        line_text = text
+                        speaker_to_match = None
+                    emit(line_text, speaker_to_match)
 
-    # final flush
-    flush_context()
+            # final flush
+            flush_context()
 
-    # write combined file
-    out_txt = os.path.join(output_dir, f"{base}_combined.txt")
-    with open(out_txt, 'w', encoding='utf-8') as f:
-        for line in combined:
-            f.write(line + '\n')
+            meta_f.write(b'\n]')
 
-    # write metadata JSON
-    out_meta = os.path.join(output_dir, f"{base}_metadata.json")
-    with open(out_meta, 'w', encoding='utf-8') as f:
-        json.dump(metadata_list, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_txt, out_txt)
+        os.replace(tmp_meta, out_meta)
+    except BaseException:
+        for tmp_path in (tmp_txt, tmp_meta):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
 
 
 # Przykład wywołania funkcji bez argparse:
 if __name__ == '__main__':
     process_html_transcripts(
         transcript_dir='data/transcripts/10/1',
-        deputies_path='data/deputies/10/deputies.csv',
+        name_automaton=load_metadata('data/deputies/10/deputies.csv'),
         output_dir='output'
     )
\ No newline at end of file
@@ -1,14 +1,97 @@
+import asyncio
+import functools
 import json
 import os
 
-import requests
+import aiohttp
 
 path = "data/transcripts/"
 
+# Maksymalna liczba równoległych zapytań do API Sejmu
+MAX_CONCURRENCY = 16
+# Rozmiar kawałka przy strumieniowym zapisie pobieranych plików
+CHUNK_SIZE = 64 * 1024
 
-def process_transcripts(rq_data, json_data):
+
+def __retry(attempts=3, backoff=0.5):
+    """
+    Dekorator ponawiający zapytanie (korutynę) przy błędach sieciowych.
+    :param attempts: Maksymalna liczba prób
+    :param backoff: Bazowe opóźnienie w sekundach, podwajane po każdej nieudanej próbie
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return await func(*args, **kwargs)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if attempt == attempts - 1:
+                        raise
+                    await asyncio.sleep(backoff * 2 ** attempt)
+
+        return wrapper
+
+    return decorator
+
+
+@__retry()
+async def __fetch_json(session, semaphore, url):
+    """
+    Pobiera dane JSON z API Sejmu.
+    :return: Krotka (status HTTP, dane JSON lub None)
+    """
+    async with semaphore:
+        async with session.get(url) as response:
+            if response.status != 200:
+                return response.status, None
+            return response.status, await response.json()
+
+
+@__retry()
+async def __download_file(session, semaphore, url, file_path):
+    """
+    Pobiera odpowiedź z API Sejmu strumieniowo, kawałkami prosto do pliku.
+    Zapis idzie do pliku tymczasowego, więc przerwane pobieranie nie zostawia niepełnego pliku.
+    :return: Status HTTP
+    """
+    async with semaphore:
+        async with session.get(url) as response:
+            if response.status != 200:
+                return response.status
+            tmp_path = f'{file_path}.part'
+            with open(tmp_path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(tmp_path, file_path)
+            return response.status
+
+
+async def __download_statement(session, semaphore, rq_data, statement_num):
+    """
+    Pobiera transkrypt pojedynczej wypowiedzi w html, jeśli jeszcze nie istnieje.
+    """
+    html_path = f'{path}{rq_data.get("term_number")}/{rq_data.get("proceeding_num")}/{rq_data.get("date")}_{statement_num}.html'
+
+    # Sprawdzenie, czy transkrypt już istnieje
+    if os.path.exists(html_path):
+        # print(f'Transkrypt {statement_num} już istnieje.')
+        return
+
+    await __download_file(
+        session, semaphore,
+        f'https://api.sejm.gov.pl/sejm/term{rq_data.get("term_number")}/proceedings/{rq_data.get("proceeding_num")}/{rq_data.get("date")}/transcripts/{statement_num}',
+        html_path
+    )
+    # print(f'Zapisano transkrypt: {html_path}')
+
+
+async def process_transcripts(session, semaphore, rq_data, json_data):
     """
     Przetwarzanie transkryptów z API Sejmu.
+    :param session: Sesja aiohttp współdzielona przez wszystkie zapytania
+    :param semaphore: Semafor ograniczający liczbę równoległych zapytań
     :param json_data: Dane JSON z API Sejmu
     :return: None
     """
@@ -35,87 +118,90 @@ def process_transcripts(rq_data, json_data):
     with open(json_path, 'w', encoding='utf-8') as f:
         json.dump(json_data, f, ensure_ascii=False, indent=2)
 
-    # Iteracja po transkryptach
-    for statement in json_data['statements']:
-        # Pobierz transkrypt wypowiedzi w html
-        if 'num' in statement:
-            statement_num = statement['num']
+    # Pobieranie transkryptów wypowiedzi w html równolegle
+    await asyncio.gather(*[
+        __download_statement(session, semaphore, rq_data, statement['num'])
+        for statement in json_data['statements']
+        if 'num' in statement
+    ])
 
-            # Sprawdzenie, czy transkrypt już istnieje
-            if os.path.exists(
-                    f'{path}{rq_data.get("term_number")}/{rq_data.get("proceeding_num")}/{rq_data.get("date")}_{statement_num}.html'):
-                # print(f'Transkrypt {statement_num} już istnieje.')
-                continue
 
-            response = requests.get(
-                f'https://api.sejm.gov.pl/sejm/term{rq_data.get("term_number")}/proceedings/{rq_data.get("proceeding_num")}/{rq_data.get("date")}/transcripts/{statement_num}'
-            )
+async def __download_date(session, semaphore, term_number, proceeding_num, date):
+    """
+    Pobiera listę transkryptów dla jednego dnia posiedzenia i zapisuje je na dysku.
+    """
+    # Pobieranie listy transkryptów
+    status, transcripts = await __fetch_json(
+        session, semaphore,
+        f'https://api.sejm.gov.pl/sejm/term{term_number}/proceedings/{proceeding_num}/{date}/transcripts'
+    )
 
-            if response.status_code == 200:
-                html_path = f'{path}{rq_data.get("term_number")}/{rq_data.get("proceeding_num")}/{rq_data.get("date")}_{statement_num}.html'
-                with open(html_path, 'wb') as f:
-                    f.write(response.content)
-                # print(f'Zapisano transkrypt: {html_path}')
+    if status == 200:
+        request_data = {
+            "term_number": term_number,
+            "proceeding_num": proceeding_num,
+            "date": date
+        }
 
+        await process_transcripts(session, semaphore, request_data, transcripts)
+    else:
+        print(f'Nie znaleziono transkryptów dla {date}')
 
-def download_transcripts():
+
+async def download_transcripts():
     """
     Główna funkcja wykonująca przetwarzanie danych z API Sejmu.
+    Wywołanie: asyncio.run(download_transcripts())
     """
-    # Pobieranie wszystkich kadencji z API Sejmu
-    response = requests.get('https://api.sejm.gov.pl/sejm/term')
-    terms = response.json()
-
-    for term in terms:
-        term_number = term['num']
-        term_from = term['from']
-        term_current = term['current']
-        # Ustalamy datę zakończenia kadencji
-        term_to = 'present'
-        if not term_current:
-            term_to = term['to']
-        print(f'Przetwarzanie kadencji: {term_number} ({term_from} - {term_to})')
-
-        # Tworzenie katalogu dla danej kadencji
-        term_dir = f'{path}{term_number}'
-        if not os.path.exists(term_dir):
-            os.makedirs(term_dir)
-
-        # Pobieranie posiedzeń dla danej kadencji
-        response = requests.get(f'https://api.sejm.gov.pl/sejm/term{term_number}/proceedings')
-        proceedings = response.json()
-
-        for proceeding in proceedings:
-            proceeding_num = proceeding['number']
-            proceeding_dates = proceeding['dates']
-            print(f'Przetwarzanie posiedzenia: {proceeding_num} ({proceeding_dates})')
-
-            # Tworzenie katalogu dla danego posiedzenia
-            proceeding_dir = f'{term_dir}/{proceeding_num}'
-            if not os.path.exists(proceeding_dir):
-                os.makedirs(proceeding_dir)
-            # Przetwarzanie dat dla danego posiedzenia
-            for date in proceeding_dates:
-                # print(f'Przetwarzanie daty: {date}')
-
-                # Pominięcie przetwarzania, jeśli plik już istnieje
-                if os.path.exists(f'{proceeding_dir}/{date}.pdf'):
-                    # print(f'Plik PDF dla {date} już istnieje')
-                    continue
-
-                # Pobieranie listy transkryptów
-                transcripts = requests.get(
-                    f'https://api.sejm.gov.pl/sejm/term{term_number}/proceedings/{proceeding_num}/{date}/transcripts'
-                )
-
-                if transcripts.status_code == 200:
-                    request_data = {
-                        "term_number": term_number,
-                        "proceeding_num": proceeding_num,
-                        "date": date
-                    }
-
-                    process_transcripts(request_data, transcripts.json())
-                else:
-                    print(f'Nie znaleziono transkryptów dla {date}')
-                    continue
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # Pobieranie wszystkich kadencji z API Sejmu
+        _, terms = await __fetch_json(session, semaphore, 'https://api.sejm.gov.pl/sejm/term')
+
+        # Zbieramy wszystkie trójki (kadencja, posiedzenie, data) do pobrania
+        jobs = []
+        for term in terms:
+            term_number = term['num']
+            term_from = term['from']
+            term_current = term['current']
+            # Ustalamy datę zakończenia kadencji
+            term_to = 'present'
+            if not term_current:
+                term_to = term['to']
+            print(f'Przetwarzanie kadencji: {term_number} ({term_from} - {term_to})')
+
+            # Tworzenie katalogu dla danej kadencji
+            term_dir = f'{path}{term_number}'
+            if not os.path.exists(term_dir):
+                os.makedirs(term_dir)
+
+            # Pobieranie posiedzeń dla danej kadencji
+            _, proceedings = await __fetch_json(
+                session, semaphore, f'https://api.sejm.gov.pl/sejm/term{term_number}/proceedings'
+            )
+
+            for proceeding in proceedings:
+                proceeding_num = proceeding['number']
+                proceeding_dates = proceeding['dates']
+                print(f'Przetwarzanie posiedzenia: {proceeding_num} ({proceeding_dates})')
+
+                # Tworzenie katalogu dla danego posiedzenia
+                proceeding_dir = f'{term_dir}/{proceeding_num}'
+                if not os.path.exists(proceeding_dir):
+                    os.makedirs(proceeding_dir)
+                # Przetwarzanie dat dla danego posiedzenia
+                for date in proceeding_dates:
+                    # print(f'Przetwarzanie daty: {date}')
+
+                    # Pominięcie przetwarzania, jeśli plik już istnieje
+                    if os.path.exists(f'{proceeding_dir}/{date}.pdf'):
+                        # print(f'Plik PDF dla {date} już istnieje')
+                        continue
+
+                    jobs.append((term_number, proceeding_num, date))
+
+        await asyncio.gather(*[
+            __download_date(session, semaphore, term_number, proceeding_num, date)
+            for term_number, proceeding_num, date in jobs
+        ])